@@ -4,7 +4,7 @@ Description: Render a list of VTK data, track data, a nifti image, then view or
 The code uses dipy and fury.
 
 Usage:
-  VTKPolyData_dipy.py [--vtk f1...] [--vtk2 f1...] [--image <nifti_file>] [--track f1...] [--sh sh_file] [--tensor tensor_file] [--axes x,y,z] [--box x0,x1,y0,y1,z0,z1] [--image-opacity opa] [--sh-scale scale] [--sh-opacity opa] [--tensor-scale scale] [--tensor-opacity opa] [--size s1,s2] [--wc] [--frame] [--scalar-range r1,r2] [--png pngfile] [--png_num n] [--zoom zoom] [--bgcolor r,g,b] [-v] [--no-normal] [--ni] [--angle azimuth,elevation]
+  VTKPolyData_dipy.py [--vtk f1...] [--vtk2 f1...] [--image <nifti_file>] [--track f1...] [--sh sh_file] [--tensor tensor_file] [--axes x,y,z] [--box x0,x1,y0,y1,z0,z1] [--image-opacity opa] [--sh-scale scale] [--sh-opacity opa] [--tensor-scale scale] [--tensor-opacity opa] [--size s1,s2] [--wc] [--frame] [--scalar-range r1,r2] [--png pngfile] [--png_num n] [--zoom zoom] [--bgcolor r,g,b] [-v] [--no-normal] [--ni] [--gpu-load] [--angle azimuth,elevation]
   VTKPolyData_dipy.py (-h | --help)
   VTKPolyData_dipy.py --version
 
@@ -34,6 +34,7 @@ Options:
   --frame                  Wireframe visualization.
   --no-normal              Do not use vtkPolyDataNormals for polydata visualization.
   --ni                     No interpolation for image. Set InterpolateOff.
+  --gpu-load               Read --sh/--tensor into GPU memory with kvikio (GPUDirect Storage), SH to SF and tensor eigen decomposition run on the GPU. Needs cupy and kvikio.
 
   -h --help                Show this screen.
   -v --verbose             Verbose.
@@ -52,6 +53,8 @@ Author(s): Jian Cheng (jian.cheng.1983@gmail.com)
 
 import os, re
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from docopt import docopt
 
 import utlVTK
@@ -60,30 +63,49 @@ import utlDMRITool as utl
 
 import nibabel as nib
 from fury import actor, window, ui
-from dipy.io.image import load_nifti
 from dipy.io.streamline import load_tractogram
 from dipy.io.vtk import load_vtk_streamlines
 from dipy.io.dpy import Dpy
 from fury.utils import fix_winding_order
 from dipy.reconst.shm import sh_to_sf_matrix, order_from_ncoef
-from dipy.reconst.dti import from_lower_triangular, decompose_tensor
 from dipy.data import get_sphere
+from dtdipy.io.image import load_nifti_gpu
+from dtdipy.io.streamline import load_trk_streamlines, load_tck_streamlines
+from dtdipy.reconst.dti import decompose_lower_triangular
+from dtdipy.tracking.streamline import transform_streamlines
+from dtdipy.viz.actor import tensor_slicer, streamlines_actor, odf_slicer_gpu
+
+
+def build_lut(hue_range):
+    """build a linear lookup table with 256 colors in the given hue range"""
+
+    lut = vtk.vtkLookupTable()
+    lut.SetHueRange(hue_range[0], hue_range[1])
+    lut.SetRampToLinear()
+    lut.SetNumberOfTableValues(256)
+    lut.Build()
+    return lut
+
+
+#  template lookup tables for --vtk files, and for --vtk2 files (tensors colored by directions)
+_LUT_VTK = build_lut((0.6667, 0))
+_LUT_VTK2 = build_lut((0.0, 1.0))
+
+
+#  separators of list inputs and of value inputs like (x,y,z)
+_LIST_SEP = re.compile(r'[,\s]\s*')
+_VALUE_SEP = re.compile(r'[(),]')
 
 
 def arg_list(list_input):
     """parse input list. Multiple inputs split by space or comma."""
 
-    tmp_list = [re.split(r'[,\s]\s*', x) for x in list_input]
-    out_list = [item for sublist in tmp_list for item in sublist]
-    return out_list
+    return [item for x in list_input for item in _LIST_SEP.split(x)]
 
 
 def arg_values(value, typefunc, numberOfValues):
     """set arguments based using comma. If numberOfValues<0, it supports arbitrary number of inputs."""
-    value = value.strip()
-    if value[0]=='(' and value[-1]==')':
-        value = value[1:-1]
-    values = value.split(',')
+    values = [v for v in _VALUE_SEP.split(value) if v.strip()]
     if numberOfValues > 0 and len(values) != numberOfValues:
         raise("wrong number of input values")
     return list(map(typefunc, values))
@@ -100,8 +122,8 @@ def get_input_args(args):
     _args['--track'] = arg_list(args['--track']) if args['--track'] else args['--track']
 
     #  split by comma, given number of inputs
-    _args['--axes'] = arg_values(args['--axes'], float, 3)
-    _args['--box'] = arg_values(args['--box'], int, 6)
+    _args['--axes'] = np.array(arg_values(args['--axes'], float, 3), dtype=np.int8)
+    _args['--box'] = np.array(arg_values(args['--box'], int, 6), dtype=np.int32).reshape(3, 2)
     _args['--scalar-range'] = arg_values(args['--scalar-range'], float, 2)
     _args['--size'] = arg_values(args['--size'], int, 2)
     _args['--bgcolor'] = arg_values(args['--bgcolor'], float, 3)
@@ -120,42 +142,35 @@ def get_input_args(args):
 
 
 def set_box_on_shape(box, shape):
-    """correct box values based on shape"""
+    """correct box values based on shape. box is a (3,2) array of [min, max] along x, y, z."""
 
-    for i in range(3):
-        if box[2*i]>box[2*i+1]:
-            raise("wrong box is given. box=", box)
-        box[2*i] = max(box[2*i], 0)
-        box[2*i+1] = shape[i]-1 if box[2*i+1]<0 else min(box[2*i+1], shape[i]-1)
+    if (box[:, 0] > box[:, 1]).any():
+        raise("wrong box is given. box=", box)
+    last = np.asarray(shape[:3], dtype=box.dtype) - 1
+    np.maximum(box[:, 0], 0, out=box[:, 0])
+    box[:, 1] = np.where(box[:, 1] < 0, last, np.minimum(box[:, 1], last))
 
 
 def update_visualbox(box, vbox):
-    """update the visual vbox based on the given box"""
+    """update the visual vbox based on the given box. Both are (3,2) arrays, -1 means not set."""
 
     # if box is default value, do not change vbox
-    if box==[-1]*len(box):
+    if (box == -1).all():
         return
 
+    lo, hi = box[:, 0], box[:, 1]
+    v0, v1 = vbox[:, 0], vbox[:, 1]
+
     #  if vbox is a x/y/z slice, and it is out of the box, make it invisible
-    for i in range(3):
-        if vbox[2*i]==vbox[2*i+1]:
-            if box[2*i]>=0 and box[2*i+1]>=0 and not box[2*i]<=vbox[2*i]<=box[2*i+1]:
-                vbox[2*i] = vbox[2*i+1] = -1
-            elif box[2*i]<0 and box[2*i+1]>=0 and not vbox[2*i]<=box[2*i+1]:
-                vbox[2*i] = vbox[2*i+1] = -1
-            elif box[2*i]>=0 and box[2*i+1]<0 and not box[2*i]<=vbox[2*i]:
-                vbox[2*i] = vbox[2*i+1] = -1
+    vbox[(v0 == v1) & (((lo >= 0) & (v0 < lo)) | ((hi >= 0) & (v0 > hi)))] = -1
 
     # update vbox as the intersection between box and vbox
-    for i in range(3):
-        if vbox[2*i]!=-1 and box[2*i]!=-1:
-            vbox[2*i] = max(box[2*i], vbox[2*i])
-        if vbox[2*i+1]!=-1 and box[2*i+1]!=-1:
-            vbox[2*i+1] = min(box[2*i+1], vbox[2*i+1])
+    np.maximum(v0, lo, out=v0, where=(v0 != -1) & (lo != -1))
+    np.minimum(v1, hi, out=v1, where=(v1 != -1) & (hi != -1))
 
 
-def scene_add_tract(scene, track_file, affine, _args):
-    """add a track file"""
+def read_streamlines(track_file, _args):
+    """read streamlines from a track file"""
 
     if _args['--image']:
         tg = load_tractogram(track_file, _args['--image'], bbox_valid_check=False)
@@ -163,11 +178,9 @@ def scene_add_tract(scene, track_file, affine, _args):
     else:
         _, extension = os.path.splitext(track_file)
         if extension == '.trk':
-            tg = load_tractogram(track_file, 'same', bbox_valid_check=False)
-            streamlines = tg.streamlines
+            streamlines = load_trk_streamlines(track_file)
         elif extension == '.tck':
-            tractogram_obj = nib.streamlines.load(track_file).tractogram
-            streamlines = tractogram_obj.streamlines
+            streamlines = load_tck_streamlines(track_file)
         elif extension in ['.vtk', '.fib']:
             streamlines = load_vtk_streamlines(track_file)
         elif extension in ['.dpy']:
@@ -175,19 +188,45 @@ def scene_add_tract(scene, track_file, affine, _args):
             streamlines = list(dpy_obj.read_tracks())
             dpy_obj.close()
 
+    return streamlines
+
+
+def scene_add_tract(scene, streamlines, affine, _args):
+    """add streamlines"""
+
     if not _args['--wc']:
-        from dipy.tracking.streamline import transform_streamlines
-        streamlines = transform_streamlines(streamlines, np.linalg.inv(affine))
+        streamlines = transform_streamlines(streamlines, affine, inverse=True, in_place=True)
 
-    stream_actor = actor.line(streamlines)
+    stream_actor = streamlines_actor(streamlines)
 
     scene.add(stream_actor)
 
 
-def scene_add_vtk(scene, vtk_file, _args, is_vtk2):
-    """add a vtk file"""
+@lru_cache(maxsize=None)
+def _read_polydata(vtk_file, mtime, use_normal):
+    """read a vtk file and compute its normals. Return the raw and the surface polydata. Cached by file path and modification time."""
 
     polyData = utlVTK.readPolydata(vtk_file)
+    surfaceData = polyData
+
+    if use_normal and polyData.GetPointData().GetNormals() is None:
+        polyDataNormals = vtk.vtkPolyDataNormals()
+        polyDataNormals.SetInputData(polyData)
+        # polyDataNormals.SetFeatureAngle(90.0)
+        polyDataNormals.Update()
+        surfaceData = polyDataNormals.GetOutput()
+
+    return polyData, surfaceData
+
+
+def read_polydata_and_normals(vtk_file, _args):
+    """read a vtk file. The surface polydata has point normals computed unless --no-normal is set"""
+
+    return _read_polydata(vtk_file, os.path.getmtime(vtk_file), not _args['--no-normal'])
+
+
+def scene_add_vtk(scene, polyData, surfaceData, _args, is_vtk2):
+    """add a vtk polydata. The wireframe uses the raw polydata, the surface uses surfaceData with normals"""
 
     if _args['--frame']:
         frame_mapper = vtk.vtkDataSetMapper()
@@ -200,39 +239,20 @@ def scene_add_vtk(scene, vtk_file, _args, is_vtk2):
         scene.AddActor(frame_actor)
 
     surface_mapper = vtk.vtkDataSetMapper()
-
-    if not _args['--no-normal'] and polyData.GetPointData().GetNormals() is None:
-        polyDataNormals = vtk.vtkPolyDataNormals()
-        try:
-            polyDataNormals.SetInputData(polyData)
-        except:
-            polyDataNormals.SetInput(polyData)
-        # polyDataNormals.SetFeatureAngle(90.0)
-        surface_mapper.SetInputConnection(
-            polyDataNormals.GetOutputPort())
-    else:
-        try:
-            surface_mapper.SetInputData(polyData)
-        except:
-            surface_mapper.SetInput(polyData)
+    surface_mapper.SetInputData(surfaceData)
 
     if polyData.GetPointData().GetScalars() and polyData.GetPointData().GetScalars().GetNumberOfComponents()==1:
-        lut = vtk.vtkLookupTable()
         if _args['--scalar-range'][0] == -1 or _args['--scalar-range'][1] == -1:
             valueRange = polyData.GetScalarRange()
         vr0 = _args['--scalar-range'][0] if _args['--scalar-range'][0] != -1 else valueRange[0]
         vr1 = _args['--scalar-range'][1] if _args['--scalar-range'][1] != -1 else valueRange[1]
         valueRange = (vr0, vr1)
-        lut.SetTableRange(valueRange[0], valueRange[1])
-        if is_vtk2:
-            #  for tensors colored by directions
-            lut.SetHueRange(0.0,1.0)
-        else:
-            lut.SetHueRange(0.6667, 0)
-        #  lut.SetHueRange(args.hue_range[0], args.hue_range[1])
-        lut.SetRampToLinear()
-        lut.Build()
 
+        #  each mapper owns a copy of the template lut. The mapper sets its scalar range on its lut,
+        #  a lut shared by mappers with different ranges would be modified and remapped on every render.
+        lut = vtk.vtkLookupTable()
+        lut.DeepCopy(_LUT_VTK2 if is_vtk2 else _LUT_VTK)
+        lut.SetTableRange(valueRange[0], valueRange[1])
         surface_mapper.SetLookupTable(lut)
         surface_mapper.SetScalarRange(valueRange[0], valueRange[1])
 
@@ -244,10 +264,33 @@ def scene_add_vtk(scene, vtk_file, _args, is_vtk2):
     scene.add(surface_actor)
 
 
+@lru_cache(maxsize=None)
+def _sphere(name, fix_winding=False):
+    """get a sphere by name, optionally with faces in a consistent winding order. Cached."""
+
+    sphere = get_sphere(name)
+    if fix_winding:
+        sphere.faces = fix_winding_order(sphere.vertices, sphere.faces, True)
+    return sphere
+
+
+@lru_cache(maxsize=None)
+def _sh_to_sf_matrix(sphere_name, sh_order, fix_winding=False):
+    """float32 SH to SF matrix on the sphere from _sphere. Cached by sphere and SH order."""
+
+    B = sh_to_sf_matrix(_sphere(sphere_name, fix_winding=fix_winding), sh_order, return_inv=False)
+    return B.astype(np.float32)
+
+
 def scene_add_image(scene, image_file, actor_dict, _args):
     """add a 3D image"""
 
-    data, affine = load_nifti(image_file)
+    #  the slicer needs host data, so --gpu-load does not apply to the image
+    img = nib.load(image_file)
+    #  keep the on-disk dtype, the slicer maps the values to uint8 colors anyway
+    data, affine = np.asanyarray(img.dataobj), img.affine
+    #  numpy_to_vtk in the slicer reads the raw bytes, swap big-endian data to native byte order
+    data = data.astype(data.dtype.newbyteorder('='), copy=False)
     shape = data.shape
     if _args['--verbose']:
         print('image shape=', shape)
@@ -260,6 +303,7 @@ def scene_add_image(scene, image_file, actor_dict, _args):
 
     actor_dict['image_actor_z'].opacity(_args['--image-opacity'])
 
+    #  copies share the vtkImageMapToColors output of image_actor_z, only the display extent differs
     actor_dict['image_actor_x'] = actor_dict['image_actor_z'].copy()
     x_midpoint = int(np.round(shape[0] / 2))
     actor_dict['image_actor_x'].display_extent(x_midpoint,
@@ -294,19 +338,24 @@ def scene_add_image(scene, image_file, actor_dict, _args):
 def scene_add_sh(scene, sh_file, actor_dict, _args):
     """add a 4D SH image file"""
 
-    sh_img = nib.load(sh_file)
-    sh = sh_img.get_fdata()
-    sh_affine = sh_img.affine
+    if _args['--gpu-load']:
+        sh, sh_affine = load_nifti_gpu(sh_file)
+    else:
+        sh_img = nib.load(sh_file)
+        #  keep the on-disk dtype, get_fdata() would upcast the 4D volume to float64
+        sh = np.asanyarray(sh_img.dataobj)
+        sh_affine = sh_img.affine
+    #  FURY renders in float32, keep SH and the SH to SF products in float32 as well
+    sh = sh.astype(np.float32, copy=False)
     affine = sh_affine if _args['--wc'] else np.eye(4)
     grid_shape = sh.shape[:-1]
     sh_order = order_from_ncoef(sh.shape[-1])
 
-    sphere_low = get_sphere('repulsion100')
-    B_low = sh_to_sf_matrix(sphere_low, sh_order, return_inv=False)
+    sphere_low = _sphere('repulsion100')
+    B_low = _sh_to_sf_matrix('repulsion100', sh_order)
 
-    sphere_high = get_sphere('symmetric362')
-    sphere_high.faces = fix_winding_order(sphere_high.vertices, sphere_high.faces, True)
-    B_high = sh_to_sf_matrix(sphere_high, sh_order, return_inv=False)
+    sphere_high = _sphere('symmetric362', fix_winding=True)
+    B_high = _sh_to_sf_matrix('symmetric362', sh_order, fix_winding=True)
 
     _args['sphere_dict'] = {'Low resolution': (sphere_low, B_low),
                 'High resolution': (sphere_high, B_high)}
@@ -318,35 +367,42 @@ def scene_add_sh(scene, sh_file, actor_dict, _args):
     opacity = _args['--sh-opacity']
     global_cm = False
 
-    # SH (ODF/EAP) slicer for axial slice
-    vbox = [0, grid_shape[0] - 1, 0, grid_shape[1] - 1, grid_shape[2]//2, grid_shape[2]//2]
-    update_visualbox(_args['--box'], vbox)
-    actor_dict['sh_actor_z'] = actor.odf_slicer(sh, affine=affine, sphere=sphere_low,
+    if _args['--gpu-load']:
+        #  SH of non-zero voxels stay in device memory, shared by the three slicers.
+        #  SF is evaluated on the GPU only for the voxels inside the display extent.
+        sh_mask = (sh != 0).any(axis=-1)
+        indices = np.nonzero(sh_mask.get())
+        sh = sh[sh_mask]
+
+    def sh_slicer():
+        if _args['--gpu-load']:
+            return odf_slicer_gpu(sh, indices, grid_shape, sphere_low, B_low, affine=affine,
+                                scale=scale, norm=norm,
+                                radial_scale=radial_scale, opacity=opacity,
+                                colormap=colormap, global_cm=global_cm)
+        return actor.odf_slicer(sh, affine=affine, sphere=sphere_low,
                                 scale=scale, norm=norm,
                                 radial_scale=radial_scale, opacity=opacity,
                                 colormap=colormap, global_cm=global_cm,
                                 B_matrix=B_low)
-    actor_dict['sh_actor_z'].display_extent(vbox[0],vbox[1],vbox[2],vbox[3],vbox[4],vbox[5])
+
+    # SH (ODF/EAP) slicer for axial slice
+    vbox = np.array([[0, grid_shape[0] - 1], [0, grid_shape[1] - 1], [grid_shape[2]//2, grid_shape[2]//2]], dtype=np.int32)
+    update_visualbox(_args['--box'], vbox)
+    actor_dict['sh_actor_z'] = sh_slicer()
+    actor_dict['sh_actor_z'].display_extent(*vbox.ravel())
 
     # SH slicer for coronal slice
-    vbox = [0, grid_shape[0] - 1, grid_shape[1]//2, grid_shape[1]//2, 0, grid_shape[2] - 1]
+    vbox = np.array([[0, grid_shape[0] - 1], [grid_shape[1]//2, grid_shape[1]//2], [0, grid_shape[2] - 1]], dtype=np.int32)
     update_visualbox(_args['--box'], vbox)
-    actor_dict['sh_actor_y'] = actor.odf_slicer(sh, affine=affine, sphere=sphere_low,
-                                scale=scale, norm=norm,
-                                radial_scale=radial_scale, opacity=opacity,
-                                colormap=colormap, global_cm=global_cm,
-                                B_matrix=B_low)
-    actor_dict['sh_actor_y'].display_extent(vbox[0],vbox[1],vbox[2],vbox[3],vbox[4],vbox[5])
+    actor_dict['sh_actor_y'] = sh_slicer()
+    actor_dict['sh_actor_y'].display_extent(*vbox.ravel())
 
     # SH slicer for sagittal slice
-    vbox = [grid_shape[0]//2, grid_shape[0]//2, 0, grid_shape[1] - 1, 0, grid_shape[2] - 1]
+    vbox = np.array([[grid_shape[0]//2, grid_shape[0]//2], [0, grid_shape[1] - 1], [0, grid_shape[2] - 1]], dtype=np.int32)
     update_visualbox(_args['--box'], vbox)
-    actor_dict['sh_actor_x'] = actor.odf_slicer(sh, affine=affine, sphere=sphere_low,
-                                scale=scale, norm=norm,
-                                radial_scale=radial_scale, opacity=opacity,
-                                colormap=colormap, global_cm=global_cm,
-                                B_matrix=B_low)
-    actor_dict['sh_actor_x'].display_extent(vbox[0],vbox[1],vbox[2],vbox[3],vbox[4],vbox[5])
+    actor_dict['sh_actor_x'] = sh_slicer()
+    actor_dict['sh_actor_x'].display_extent(*vbox.ravel())
 
     if _args['--axes'][0]==1:
         scene.add(actor_dict['sh_actor_x'])
@@ -361,39 +417,44 @@ def scene_add_sh(scene, sh_file, actor_dict, _args):
 def scene_add_tensor(scene, tensor_file, actor_dict, _args):
     """add a 4D tensor image file with 6 dimension (lower triangle format)"""
 
-    tensor_img = nib.load(tensor_file)
-    tensor = tensor_img.get_fdata()
-    tensor_affine = tensor_img.affine
+    if _args['--gpu-load']:
+        tensor, tensor_affine = load_nifti_gpu(tensor_file)
+    else:
+        tensor_img = nib.load(tensor_file)
+        tensor = np.asanyarray(tensor_img.dataobj)
+        tensor_affine = tensor_img.affine
+    tensor = tensor.astype(np.float32, copy=False)
 
     affine = tensor_affine if _args['--wc'] else np.eye(4)
     grid_shape = tensor.shape[:-1]
 
-    evals, evecs = decompose_tensor(from_lower_triangular(np.asarray(tensor)),
-                                    min_diffusivity=0)
+    evals, evecs = decompose_lower_triangular(tensor, min_diffusivity=0)
+    if _args['--gpu-load']:
+        evals, evecs = evals.get(), evecs.get()
 
 
     # Do not normalize eigenvalues by default
     norm_evals = False
 
     #  sphere = get_sphere('symmetric362')
-    sphere = get_sphere('repulsion100')
+    sphere = _sphere('repulsion100')
     scale = _args['--tensor-scale']
     opacity = _args['--tensor-opacity']
 
-    vbox = [0, grid_shape[0] - 1, 0, grid_shape[1] - 1, grid_shape[2]//2, grid_shape[2]//2]
+    vbox = np.array([[0, grid_shape[0] - 1], [0, grid_shape[1] - 1], [grid_shape[2]//2, grid_shape[2]//2]], dtype=np.int32)
     update_visualbox(_args['--box'], vbox)
-    actor_dict['tensor_actor_z'] = actor.tensor_slicer(evals, evecs, affine, norm=norm_evals, sphere=sphere, scale=scale, opacity=opacity)
-    actor_dict['tensor_actor_z'].display_extent(vbox[0],vbox[1],vbox[2],vbox[3],vbox[4],vbox[5])
+    actor_dict['tensor_actor_z'] = tensor_slicer(evals, evecs, affine, norm=norm_evals, sphere=sphere, scale=scale, opacity=opacity)
+    actor_dict['tensor_actor_z'].display_extent(*vbox.ravel())
 
-    vbox = [0, grid_shape[0] - 1, grid_shape[1]//2, grid_shape[1]//2, 0, grid_shape[2] - 1]
+    vbox = np.array([[0, grid_shape[0] - 1], [grid_shape[1]//2, grid_shape[1]//2], [0, grid_shape[2] - 1]], dtype=np.int32)
     update_visualbox(_args['--box'], vbox)
-    actor_dict['tensor_actor_y'] = actor.tensor_slicer(evals, evecs, affine, norm=norm_evals, sphere=sphere, scale=scale, opacity=opacity)
-    actor_dict['tensor_actor_y'].display_extent(vbox[0],vbox[1],vbox[2],vbox[3],vbox[4],vbox[5])
+    actor_dict['tensor_actor_y'] = tensor_slicer(evals, evecs, affine, norm=norm_evals, sphere=sphere, scale=scale, opacity=opacity)
+    actor_dict['tensor_actor_y'].display_extent(*vbox.ravel())
 
-    vbox = [grid_shape[0]//2, grid_shape[0]//2, 0, grid_shape[1] - 1, 0, grid_shape[2] - 1]
+    vbox = np.array([[grid_shape[0]//2, grid_shape[0]//2], [0, grid_shape[1] - 1], [0, grid_shape[2] - 1]], dtype=np.int32)
     update_visualbox(_args['--box'], vbox)
-    actor_dict['tensor_actor_x'] = actor.tensor_slicer(evals, evecs, affine, norm=norm_evals, sphere=sphere, scale=scale, opacity=opacity)
-    actor_dict['tensor_actor_x'].display_extent(vbox[0],vbox[1],vbox[2],vbox[3],vbox[4],vbox[5])
+    actor_dict['tensor_actor_x'] = tensor_slicer(evals, evecs, affine, norm=norm_evals, sphere=sphere, scale=scale, opacity=opacity)
+    actor_dict['tensor_actor_x'].display_extent(*vbox.ravel())
 
 
     if _args['--axes'][0]==1:
@@ -433,38 +494,49 @@ def scene_add_ui(scene, _args, actor_dict, affine, shape):
                                     length=140)
 
 
+    #  visual boxes reused by the slider callbacks
+    box = _args['--box']
+    full_box = np.array([[0, shape[0] - 1], [0, shape[1] - 1], [0, shape[2] - 1]], dtype=np.int32)
+    vbox_x, vbox_y, vbox_z = full_box.copy(), full_box.copy(), full_box.copy()
+
     def change_slice_x(slider):
         x = int(np.round(slider.value))
-        vbox = [x, x, 0, shape[1] - 1, 0, shape[2] - 1]
-        update_visualbox(_args['--box'], vbox)
+        vbox = vbox_x
+        vbox[:] = full_box
+        vbox[0] = x
+        update_visualbox(box, vbox)
         if _args['--image']:
             actor_dict['image_actor_x'].display_extent(x, x, 0, shape[1] - 1, 0, shape[2] - 1)
         if _args['--tensor']:
-            actor_dict['tensor_actor_x'].display_extent(vbox[0],vbox[1],vbox[2],vbox[3],vbox[4],vbox[5])
+            actor_dict['tensor_actor_x'].display_extent(*vbox.ravel())
         if _args['--sh']:
-            actor_dict['sh_actor_x'].display_extent(vbox[0],vbox[1],vbox[2],vbox[3],vbox[4],vbox[5])
+            actor_dict['sh_actor_x'].display_extent(*vbox.ravel())
 
     def change_slice_y(slider):
         y = int(np.round(slider.value))
-        vbox = [0, shape[0] - 1, y, y, 0, shape[2] - 1]
-        update_visualbox(_args['--box'], vbox)
+        vbox = vbox_y
+        vbox[:] = full_box
+        vbox[1] = y
+        update_visualbox(box, vbox)
         if _args['--image']:
             actor_dict['image_actor_y'].display_extent(0, shape[0] - 1, y, y, 0, shape[2] - 1)
         if _args['--tensor']:
-            actor_dict['tensor_actor_y'].display_extent(vbox[0],vbox[1],vbox[2],vbox[3],vbox[4],vbox[5])
+            actor_dict['tensor_actor_y'].display_extent(*vbox.ravel())
         if _args['--sh']:
-            actor_dict['sh_actor_y'].display_extent(vbox[0],vbox[1],vbox[2],vbox[3],vbox[4],vbox[5])
+            actor_dict['sh_actor_y'].display_extent(*vbox.ravel())
 
     def change_slice_z(slider):
         z = int(np.round(slider.value))
-        vbox = [0, shape[0] - 1, 0, shape[1] - 1, z, z]
-        update_visualbox(_args['--box'], vbox)
+        vbox = vbox_z
+        vbox[:] = full_box
+        vbox[2] = z
+        update_visualbox(box, vbox)
         if _args['--image']:
             actor_dict['image_actor_z'].display_extent(0, shape[0] - 1, 0, shape[1] - 1, z, z)
         if _args['--tensor']:
-            actor_dict['tensor_actor_z'].display_extent(vbox[0],vbox[1],vbox[2],vbox[3],vbox[4],vbox[5])
+            actor_dict['tensor_actor_z'].display_extent(*vbox.ravel())
         if _args['--sh']:
-            actor_dict['sh_actor_z'].display_extent(vbox[0],vbox[1],vbox[2],vbox[3],vbox[4],vbox[5])
+            actor_dict['sh_actor_z'].display_extent(*vbox.ravel())
 
     def change_opacity(slider):
         _args['--image-opacity'] = slider.value
@@ -559,59 +631,71 @@ def main():
     actor_dict = {}
 
 
-    #  add vtk files
-    if _args['--vtk']:
-        for tf in _args['--vtk']:
-            scene_add_vtk(scene, os.path.expanduser(tf), _args, False)
-
-
-    #  add vtk2 files for tensors
-    if _args['--vtk2']:
-        for tf in _args['--vtk2']:
-            scene_add_vtk(scene, os.path.expanduser(tf), _args, True)
-
-    #  add an image file
-    if _args['--image']:
-        affine, shape = scene_add_image(scene, _args['--image'], actor_dict, _args)
-
-    if _args['--tensor']:
-        tensor_affine, tensor_shape = scene_add_tensor(scene, _args['--tensor'], actor_dict, _args)
+    #  read vtk and track files in a thread pool. Actors are added to the scene in the main thread.
+    vtk_files = [(os.path.expanduser(tf), False) for tf in (_args['--vtk'] or [])] + \
+                [(os.path.expanduser(tf), True) for tf in (_args['--vtk2'] or [])]
+    track_files = [os.path.expanduser(tf) for tf in (_args['--track'] or [])]
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(vtk_files) + len(track_files)))) as executor:
+        #  a file given more than once, e.g. to both --vtk and --vtk2, is submitted once and its result is shared
+        polydata_futures = {}
+        for tf, _ in vtk_files:
+            if tf not in polydata_futures:
+                polydata_futures[tf] = executor.submit(read_polydata_and_normals, tf, _args)
+        track_futures = [executor.submit(read_streamlines, tf, _args) for tf in track_files]
+
+        #  add vtk files, and vtk2 files for tensors
+        for tf, is_vtk2 in vtk_files:
+            polyData, surfaceData = polydata_futures[tf].result()
+            scene_add_vtk(scene, polyData, surfaceData, _args, is_vtk2)
+
+        #  add an image file
+        if _args['--image']:
+            affine, shape = scene_add_image(scene, _args['--image'], actor_dict, _args)
 
-        if _args['--image'] and tensor_shape!=shape:
-            print("Warning: tensor shape is different from image shape. tensor_shape=", tensor_shape, ", image shape=", shape)
-            shape = min(shape, tensor_shape)
-        if _args['--image'] and np.linalg.norm(tensor_affine-affine)>1e-5:
-            print("Warning: tensor affine is different from image affine. tensor_affne=", tensor_affine, ", image affine=", affine)
-        if not _args['--image']:
-            affine, shape = tensor_affine, tensor_shape
+        if _args['--tensor']:
+            tensor_affine, tensor_shape = scene_add_tensor(scene, _args['--tensor'], actor_dict, _args)
 
-    #  add a SH file
-    if _args['--sh']:
-        sh_affine, sh_shape = scene_add_sh(scene, _args['--sh'], actor_dict, _args)
+            if _args['--image'] and tensor_shape!=shape:
+                print("Warning: tensor shape is different from image shape. tensor_shape=", tensor_shape, ", image shape=", shape)
+                shape = min(shape, tensor_shape)
+            if _args['--image'] and np.linalg.norm(tensor_affine-affine)>1e-5:
+                print("Warning: tensor affine is different from image affine. tensor_affne=", tensor_affine, ", image affine=", affine)
+            if not _args['--image']:
+                affine, shape = tensor_affine, tensor_shape
 
-        if _args['--image'] and sh_shape!=shape:
-            print("Warning: sh shape is different from image shape. sh_shape=", sh_shape, ", image shape=", shape)
-            shape = min(shape, sh_shape)
-        if _args['--image'] and np.linalg.norm(sh_affine-affine)>1e-5:
-            print("Warning: sh affine is different from image affine. sh_affne=", sh_affine, ", image affine=", affine)
-        if not _args['--image']:
-            affine, shape = sh_affine, sh_shape
+        #  add a SH file
+        if _args['--sh']:
+            sh_affine, sh_shape = scene_add_sh(scene, _args['--sh'], actor_dict, _args)
 
-    if _args['--verbose']:
-        print('shape=', shape)
-        print('affine=', affine)
+            if _args['--image'] and sh_shape!=shape:
+                print("Warning: sh shape is different from image shape. sh_shape=", sh_shape, ", image shape=", shape)
+                shape = min(shape, sh_shape)
+            if _args['--image'] and np.linalg.norm(sh_affine-affine)>1e-5:
+                print("Warning: sh affine is different from image affine. sh_affne=", sh_affine, ", image affine=", affine)
+            if not _args['--image']:
+                affine, shape = sh_affine, sh_shape
 
-    if _args['--image'] or _args['--tensor'] or _args['--sh']:
-        set_box_on_shape(_args['--box'], shape)
         if _args['--verbose']:
-            print('set box=', _args['--box'])
+            print('shape=', shape)
+            print('affine=', affine)
+
+        if _args['--image'] or _args['--tensor'] or _args['--sh']:
+            set_box_on_shape(_args['--box'], shape)
+            if _args['--verbose']:
+                print('set box=', _args['--box'])
 
-    #  add track files
-    if _args['--track']:
-        for tf in _args['--track']:
-            scene_add_tract(scene, os.path.expanduser(tf), affine, _args)
+        #  add track files. Futures are dropped once used, the actor holds its own copy of the points.
+        while track_futures:
+            scene_add_tract(scene, track_futures.pop(0).result(), affine, _args)
 
     show_m = window.ShowManager(scene, size=(_args['--size']))
+    if _args['--png']:
+        #  render offscreen for --png, no window is mapped and no X events are processed.
+        #  The ShowManager is still needed, because ui callbacks are registered on its interactor.
+        #  Fully headless runs need VTK built with EGL or OSMesa. On a GPU server without monitor,
+        #  a virtual X display keeps hardware rendering:
+        #    nvidia-xconfig --use-display-device=None --virtual=1280x1024
+        show_m.window.SetOffScreenRendering(1)
     show_m.initialize()
 
     # add ui for image slice
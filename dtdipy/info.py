@@ -128,14 +128,22 @@ EXTRAS_REQUIRE = {
         "pandas",
         "tables",
         "matplotlib",
-        "fury>=0.6"
+        "fury>=0.7",
         "scikit-learn",
         "scikit-image",
         "statsmodels",
     ],
     "viz": [
-        "fury>=0.6",
-        "matplotlib"
+        "fury>=0.7",
+        "vtk>=9",
+        "matplotlib",
+        "numba"
+    ],
+    # --gpu-load, for CUDA 12. Builds for other CUDA versions are named
+    # cupy-cudaXXx and kvikio-cuXX.
+    "gpu": [
+        "cupy-cuda12x",
+        "kvikio-cu12"
     ],
     "ml": [
         "scikit_learn",
@@ -147,5 +155,6 @@ EXTRAS_REQUIRE = {
 
 }
 
-EXTRAS_REQUIRE["all"] = list(set([a[i] for a in list(EXTRAS_REQUIRE.values())
-                                  for i in range(len(a))]))
+# the gpu extra needs CUDA, it is not part of all
+EXTRAS_REQUIRE["all"] = list(set([a[i] for k, a in EXTRAS_REQUIRE.items()
+                                  if k != "gpu" for i in range(len(a))]))
@@ -0,0 +1,59 @@
+import numpy as np
+import nibabel as nib
+
+from dipy.utils.optpkg import optional_package
+
+cupy, has_cupy, _ = optional_package('cupy')
+kvikio, has_kvikio, _ = optional_package('kvikio')
+
+
+def load_nifti_gpu(fname):
+    """ Load a nifti file with its data array in GPU memory.
+
+    The header is parsed on the host by nibabel. The data segment of an
+    uncompressed ``.nii`` file is read by kvikio (GPUDirect Storage) straight
+    into a CuPy array, without a staging buffer in host memory. Other files
+    (compressed, ``.hdr``/``.img`` pairs, non-native endian data) cannot be
+    read that way, they are loaded by nibabel and copied to the device.
+
+    Parameters
+    ----------
+    fname : string
+        Path to the nifti file.
+
+    Returns
+    -------
+    data : cupy.ndarray
+        Image data on the device, in the on-disk dtype unless the header
+        has a scaling.
+    affine : ndarray (4, 4)
+        Voxel to world affine.
+    """
+    if not (has_cupy and has_kvikio):
+        raise ImportError('cupy and kvikio are required to load nifti files to GPU')
+
+    img = nib.load(fname)
+    header = img.header
+    dtype = header.get_data_dtype()
+
+    #  the file holding the data, e.g. the .img of a .hdr/.img pair
+    data_fname = img.file_map['image'].filename
+    if not str(data_fname).lower().endswith('.nii') or not dtype.isnative:
+        return cupy.asarray(np.asanyarray(img.dataobj)), img.affine
+
+    # nifti data is in Fortran order. Read it into a C-order buffer with
+    # reversed axes, then transpose the view.
+    shape = header.get_data_shape()
+    data = cupy.empty(shape[::-1], dtype=dtype)
+    with kvikio.CuFile(data_fname, 'r') as f:
+        nbytes = f.read(data, data.nbytes, int(header.get_data_offset()))
+    if nbytes != data.nbytes:
+        raise ValueError('{0} is truncated, read {1} of {2} data bytes'.format(
+            data_fname, nbytes, data.nbytes))
+    data = data.transpose()
+
+    slope, inter = header.get_slope_inter()
+    if slope is not None and (slope, inter) != (1, 0):
+        data = data * slope + (inter or 0)
+
+    return data, img.affine
@@ -0,0 +1,177 @@
+import os
+
+import numpy as np
+
+from nibabel.streamlines import ArraySequence, Field
+from nibabel.streamlines.trk import header_2_dtype, get_affine_trackvis_to_rasmm
+from nibabel.volumeutils import native_code, swapped_code
+
+
+def read_trk_header(fname):
+    """ Read the 1000 bytes header of a trk file.
+
+    Parameters
+    ----------
+    fname : string
+        Path to the trk file.
+
+    Returns
+    -------
+    header : dict
+        Header fields, keyed by ``nibabel.streamlines.Field`` names.
+    """
+    hdr = np.fromfile(fname, dtype=header_2_dtype, count=1)
+    if len(hdr) == 0:
+        raise ValueError('{0} is not a valid trk file'.format(fname))
+    endianness = native_code
+    if hdr['hdr_size'][0] != 1000:
+        hdr = hdr.view(header_2_dtype.newbyteorder())
+        endianness = swapped_code
+        if hdr['hdr_size'][0] != 1000:
+            raise ValueError('{0} is not a valid trk file'.format(fname))
+
+    header = {name: hdr[name][0] for name in header_2_dtype.names}
+    header[Field.ENDIANNESS] = endianness
+
+    # version 1 has no voxel to rasmm matrix, same defaults as nibabel
+    if header['version'] == 1 or header[Field.VOXEL_TO_RASMM][3, 3] == 0:
+        header[Field.VOXEL_TO_RASMM] = np.eye(4, dtype=np.float32)
+    if header[Field.VOXEL_ORDER] == b'':
+        header[Field.VOXEL_ORDER] = b'LPS'
+
+    return header
+
+
+def load_trk_streamlines(fname):
+    """ Load the streamlines of a trk file in RAS+ and mm space.
+
+    The file is memory mapped and the points of all streamlines are gathered
+    into one contiguous buffer with a single boolean index, instead of
+    decoding the streamlines one by one. Only the counts are read per
+    streamline. Scalars and properties are skipped.
+
+    Parameters
+    ----------
+    fname : string
+        Path to the trk file.
+
+    Returns
+    -------
+    streamlines : ArraySequence
+        Streamlines in RASMM, with the voxel center as origin (same as
+        ``load_tractogram(fname, 'same')``).
+    """
+    header = read_trk_header(fname)
+    nb_scalars = int(header[Field.NB_SCALARS_PER_POINT])
+    nb_properties = int(header[Field.NB_PROPERTIES_PER_STREAMLINE])
+    endian = header[Field.ENDIANNESS]
+
+    streamlines = ArraySequence()
+    if os.path.getsize(fname) <= 1000:
+        return streamlines
+
+    words = np.memmap(fname, dtype=endian + 'i4', mode='r', offset=1000)
+    stride = 3 + nb_scalars
+
+    #  each streamline is [n_points][n_points*(3+n_scalars) floats][n_properties floats]
+    lengths = []
+    pos, nb_words = 0, len(words)
+    while pos < nb_words:
+        n = int(words[pos])
+        lengths.append(n)
+        pos += 1 + n*stride + nb_properties
+
+    lengths = np.array(lengths, dtype=np.intp)
+    sizes = 1 + lengths*stride + nb_properties
+    starts = np.cumsum(sizes) - sizes
+
+    keep = np.ones(nb_words, dtype=bool)
+    keep[starts] = False
+    for i in range(nb_properties):
+        keep[starts + 1 + lengths*stride + i] = False
+
+    points = words.view(endian + 'f4')[keep].reshape(-1, stride)[:, :3]
+
+    #  voxmm -> rasmm
+    affine = get_affine_trackvis_to_rasmm(header).astype(np.float32)
+    data = np.dot(points, affine[:3, :3].T)
+    data += affine[:3, 3]
+
+    streamlines._data = np.ascontiguousarray(data, dtype=np.float32)
+    streamlines._offsets = np.cumsum(lengths) - lengths
+    streamlines._lengths = lengths
+    return streamlines
+
+
+def read_tck_header(fname):
+    """ Read the text header of a tck file.
+
+    Parameters
+    ----------
+    fname : string
+        Path to the tck file.
+
+    Returns
+    -------
+    header : dict
+        Header ``key: value`` pairs as strings.
+    """
+    header = {}
+    with open(fname, 'rb') as f:
+        if f.readline().strip() != b'mrtrix tracks':
+            raise ValueError('{0} is not a valid tck file'.format(fname))
+        for line in f:
+            line = line.decode('latin-1').strip()
+            if line == 'END':
+                break
+            key, _, value = line.partition(':')
+            header[key.strip()] = value.strip()
+    return header
+
+
+def load_tck_streamlines(fname):
+    """ Load the streamlines of a tck file.
+
+    The float data is memory mapped, the NaN triplets that end the
+    streamlines are found in one ``np.isnan`` pass, and the remaining points
+    are gathered into one contiguous buffer, instead of tokenizing the file
+    chunk by chunk.
+
+    Parameters
+    ----------
+    fname : string
+        Path to the tck file.
+
+    Returns
+    -------
+    streamlines : ArraySequence
+        Streamlines in RASMM, as stored in the file.
+    """
+    header = read_tck_header(fname)
+    dtype = np.dtype({'Float32LE': '<f4', 'Float32BE': '>f4',
+                      'Float64LE': '<f8', 'Float64BE': '>f8'}[header['datatype']])
+    offset = int(header['file'].split()[1])
+
+    streamlines = ArraySequence()
+    if os.path.getsize(fname) <= offset:
+        return streamlines
+
+    buf = np.memmap(fname, dtype=dtype, mode='r', offset=offset)
+    buf = buf[:len(buf) // 3 * 3].reshape(-1, 3)
+
+    #  a NaN triplet ends a streamline, an Inf triplet ends the data
+    end_of_file = np.flatnonzero(np.isinf(buf[:, 0]))
+    if len(end_of_file):
+        buf = buf[:end_of_file[0]]
+    delimiters = np.isnan(buf[:, 0])
+    ends = np.flatnonzero(delimiters)
+
+    starts = np.concatenate(([0], ends + 1))
+    lengths = np.concatenate((ends, [len(buf)])) - starts
+    #  empty streamlines (consecutive delimiters, or a delimiter before the end) are dropped as in nibabel
+    lengths = lengths[lengths > 0].astype(np.intp)
+
+    streamlines._data = buf[~delimiters].astype(dtype.newbyteorder('='))
+    streamlines._offsets = np.cumsum(lengths) - lengths
+    streamlines._lengths = lengths
+    return streamlines
@@ -0,0 +1,48 @@
+import numpy as np
+
+from dipy.utils.optpkg import optional_package
+
+cupy, has_cupy, _ = optional_package('cupy')
+
+# full 3x3 tensor from [Dxx, Dxy, Dyy, Dxz, Dyz, Dzz]
+_lt_indices = np.array([0, 1, 3, 1, 2, 4, 3, 4, 5])
+
+
+def decompose_lower_triangular(tensor, min_diffusivity=0):
+    """ Eigenvalues and eigenvectors of tensors in lower triangular format.
+
+    Same result as ``decompose_tensor(from_lower_triangular(tensor))``, but
+    the batched ``eigh`` only runs on voxels with a non-zero tensor, and the
+    full 3x3 tensors are only built for those voxels. A CuPy input is
+    decomposed on the device.
+
+    Parameters
+    ----------
+    tensor : ndarray or cupy.ndarray (..., 6)
+        Tensors in lower triangular order [Dxx, Dxy, Dyy, Dxz, Dyz, Dzz].
+    min_diffusivity : float, optional
+        Eigenvalues are clipped below this value.
+
+    Returns
+    -------
+    evals : array (..., 3)
+        Eigenvalues in descending order. Zero for empty voxels.
+    evecs : array (..., 3, 3)
+        Eigenvectors, evecs[..., :, j] is associated with evals[..., j].
+    """
+    xp = cupy.get_array_module(tensor) if has_cupy else np
+    dtype = np.promote_types(tensor.dtype, np.float32)
+    grid_shape = tensor.shape[:-1]
+
+    mask = (tensor != 0).any(axis=-1)
+    D = tensor[mask][:, xp.asarray(_lt_indices)].reshape(-1, 3, 3)
+    w, v = xp.linalg.eigh(D.astype(dtype, copy=False))
+
+    # same as eigh of a zero tensor, after reordering
+    evals = xp.zeros(grid_shape + (3,), dtype=dtype)
+    evecs = xp.empty(grid_shape + (3, 3), dtype=dtype)
+    evecs[...] = xp.eye(3, dtype=dtype)[:, ::-1]
+
+    evals[mask] = w[:, ::-1].clip(min_diffusivity, None)
+    evecs[mask] = v[:, :, ::-1]
+    return evals, evecs
@@ -0,0 +1,24 @@
+import numpy as np
+
+from dipy.utils.optpkg import optional_package
+
+cupy, has_cupy, _ = optional_package('cupy')
+
+
+def sh_to_sf_gpu(sh, B):
+    """ Evaluate SF values from SH coefficients on the GPU.
+
+    Parameters
+    ----------
+    sh : cupy.ndarray (..., n_coef)
+        SH coefficients in device memory.
+    B : ndarray (n_coef, n_vertices)
+        SH basis evaluated on the sphere vertices, see ``sh_to_sf_matrix``.
+
+    Returns
+    -------
+    sf : ndarray (..., n_vertices)
+        float32 SF values, copied back to host memory.
+    """
+    B = cupy.asarray(B, dtype=np.float32)
+    return cupy.asnumpy(cupy.matmul(sh.astype(np.float32, copy=False), B))
@@ -0,0 +1,64 @@
+import numpy as np
+
+from nibabel.streamlines import ArraySequence
+
+# points transformed per block by the in place transform
+_IN_PLACE_BLOCK = 2 ** 16
+
+
+def transform_streamlines(streamlines, mat, inverse=False, in_place=False):
+    """ Apply an affine transformation to the points of the streamlines.
+
+    Same as ``dipy.tracking.streamline.transform_streamlines``, but all points
+    are transformed by one matrix product on the contiguous data buffer of an
+    ``ArraySequence`` instead of one call per streamline.
+
+    Parameters
+    ----------
+    streamlines : ArraySequence or list of ndarray (N, 3)
+        Streamlines to transform.
+    mat : ndarray (4, 4)
+        Affine transformation.
+    inverse : bool, optional
+        Apply the inverse of ``mat``. The inverse linear part is solved from
+        the 3x3 block, the 4x4 inverse is never formed.
+    in_place : bool, optional
+        Overwrite the data buffer of the input ``ArraySequence`` instead of
+        allocating a new one. Points are transformed in blocks, so only a
+        block sized temporary is allocated. Views sharing the buffer are
+        transformed as well.
+
+    Returns
+    -------
+    new_streamlines : ArraySequence
+        Transformed streamlines, sharing offsets and lengths with the input.
+        The input itself if ``in_place`` is set.
+    """
+    if not isinstance(streamlines, ArraySequence):
+        streamlines = ArraySequence(streamlines)
+
+    data = streamlines._data
+    if data.size == 0:
+        return streamlines
+
+    R, t = mat[:3, :3], mat[:3, 3]
+    if inverse:
+        R = np.linalg.solve(R, np.eye(3))
+        t = -np.dot(R, t)
+    R, t = R.astype(data.dtype), t.astype(data.dtype)
+
+    if in_place:
+        if not data.flags.writeable:
+            raise ValueError('streamlines data is read-only, it cannot be transformed in place')
+        for i in range(0, len(data), _IN_PLACE_BLOCK):
+            block = data[i:i + _IN_PLACE_BLOCK]
+            np.matmul(block, R.T, out=block)
+            np.add(block, t, out=block)
+        return streamlines
+
+    new_streamlines = ArraySequence()
+    new_streamlines._data = np.dot(data, R.T)
+    new_streamlines._data += t
+    new_streamlines._offsets = streamlines._offsets
+    new_streamlines._lengths = streamlines._lengths
+    return new_streamlines
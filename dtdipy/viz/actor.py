@@ -0,0 +1,320 @@
+import numpy as np
+import vtk
+from vtk.util import numpy_support
+
+from nibabel.affines import apply_affine
+from nibabel.streamlines import ArraySequence
+from dipy.data import get_sphere
+from dipy.reconst.dti import color_fa, fractional_anisotropy
+from dipy.utils.optpkg import optional_package
+from fury.actors.odf_slicer import OdfSlicerActor
+from fury.utils import (set_polydata_vertices, set_polydata_triangles,
+                        set_polydata_colors, fix_winding_order)
+
+from dtdipy.reconst.shm import sh_to_sf_gpu
+
+cupy, has_cupy, _ = optional_package('cupy')
+numba, has_numba, _ = optional_package('numba')
+
+
+if has_numba:
+    # cached on disk, the script would otherwise compile the kernel on every run
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _ellipsoid_points_numba(evals, evecs, centers, vertices, scale, out):
+        for k in numba.prange(evals.shape[0]):
+            for v in range(vertices.shape[0]):
+                a0 = evals[k, 0] * vertices[v, 0]
+                a1 = evals[k, 1] * vertices[v, 1]
+                a2 = evals[k, 2] * vertices[v, 2]
+                for i in range(3):
+                    out[k, v, i] = scale * (evecs[k, i, 0] * a0 +
+                                            evecs[k, i, 1] * a1 +
+                                            evecs[k, i, 2] * a2) + centers[k, i]
+
+
+def ellipsoid_points(evals, evecs, centers, vertices, scale):
+    """ Vertices of tensor ellipsoids, one ellipsoid per voxel.
+
+    Each sphere vertex v is mapped to ``scale * evecs @ (evals * v) + center``.
+    The loop over voxels runs in parallel with numba when it is installed,
+    otherwise it is a single numpy einsum.
+
+    Parameters
+    ----------
+    evals : ndarray (N, 3)
+        Eigenvalues.
+    evecs : ndarray (N, 3, 3)
+        Eigenvectors, as columns.
+    centers : ndarray (N, 3)
+        Ellipsoid centers.
+    vertices : ndarray (V, 3)
+        Unit sphere vertices.
+    scale : float
+        Ellipsoid scale.
+
+    Returns
+    -------
+    points : ndarray (N, V, 3)
+        float32 ellipsoid vertices.
+    """
+    evals = np.ascontiguousarray(evals, dtype=np.float32)
+    evecs = np.ascontiguousarray(evecs, dtype=np.float32)
+    centers = np.ascontiguousarray(centers, dtype=np.float32)
+    vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+
+    if has_numba:
+        points = np.empty((len(evals), len(vertices), 3), dtype=np.float32)
+        _ellipsoid_points_numba(evals, evecs, centers, vertices,
+                                np.float32(scale), points)
+        return points
+
+    points = np.einsum('kij,kvj->kvi', evecs, evals[:, None, :] * vertices)
+    points *= scale
+    points += centers[:, None, :]
+    return points
+
+
+class TensorSlicerActor(vtk.vtkLODActor):
+    """ Tensor ellipsoids shown inside a display extent.
+
+    Same glyphs and colors as ``fury.actor.tensor_slicer``. The ellipsoids of
+    all voxels in the extent are computed by ``ellipsoid_points`` instead of
+    one voxel at a time.
+    """
+
+    def __init__(self, evals, evecs, affine, mask, sphere, scale, norm):
+        self.evals = evals
+        self.evecs = evecs
+        self.affine = affine
+        self.mask = mask
+        self.vertices = sphere.vertices
+        self.faces = np.asarray(sphere.faces, dtype=np.int64)
+        self.scale = scale
+        self.norm = norm
+        cfa = color_fa(fractional_anisotropy(evals), evecs)
+        self.colors = np.interp(cfa, [0, 1], [0, 255]).astype(np.uint8)
+        mapper = vtk.vtkPolyDataMapper()
+        mapper.SetInputData(vtk.vtkPolyData())
+        self.SetMapper(mapper)
+
+    def display_extent(self, x1, x2, y1, y2, z1, z2):
+        tmp_mask = np.zeros(self.mask.shape, dtype=bool)
+        tmp_mask[x1:x2 + 1, y1:y2 + 1, z1:z2 + 1] = True
+        ijk = np.nonzero(np.logical_and(tmp_mask, self.mask))
+
+        polydata = vtk.vtkPolyData()
+        if len(ijk[0]):
+            evals = self.evals[ijk]
+            if self.norm:
+                evals_max = evals.max(axis=-1, keepdims=True)
+                evals = evals / np.where(evals_max > 0, evals_max, 1)
+            centers = np.transpose(ijk)
+            if self.affine is not None:
+                centers = apply_affine(self.affine, centers)
+
+            points = ellipsoid_points(evals, self.evecs[ijk], centers,
+                                      self.vertices, self.scale)
+            nb_vertices = len(self.vertices)
+            faces = self.faces[None] + \
+                nb_vertices * np.arange(len(points))[:, None, None]
+
+            set_polydata_vertices(polydata, points.reshape(-1, 3))
+            set_polydata_triangles(polydata, faces.reshape(-1, 3))
+            set_polydata_colors(polydata,
+                                np.repeat(self.colors[ijk], nb_vertices, axis=0))
+
+        mapper = vtk.vtkPolyDataMapper()
+        mapper.SetInputData(polydata)
+        self.SetMapper(mapper)
+
+
+def tensor_slicer(evals, evecs, affine=None, mask=None, sphere=None,
+                  scale=2.2, norm=True, opacity=1.):
+    """ Slice many tensors as ellipsoids in native or world coordinates.
+
+    Drop-in for ``fury.actor.tensor_slicer``. Nothing is shown until
+    ``display_extent`` is called on the returned actor.
+
+    Parameters
+    ----------
+    evals : ndarray (X, Y, Z, 3)
+        Eigenvalues.
+    evecs : ndarray (X, Y, Z, 3, 3)
+        Eigenvectors.
+    affine : ndarray (4, 4), optional
+        Voxel to world affine of the ellipsoid centers.
+    mask : ndarray (X, Y, Z), optional
+        Voxels where ellipsoids are shown. Default all voxels.
+    sphere : Sphere, optional
+        Sphere used for the ellipsoids. Default symmetric362.
+    scale : float, optional
+        Ellipsoid scale.
+    norm : bool, optional
+        Normalize the eigenvalues by the largest one in each voxel.
+    opacity : float, optional
+        Ellipsoid opacity.
+
+    Returns
+    -------
+    tensor_actor : TensorSlicerActor
+    """
+    if mask is None:
+        mask = np.ones(evals.shape[:3], dtype=bool)
+    if sphere is None:
+        sphere = get_sphere('symmetric362')
+
+    tensor_actor = TensorSlicerActor(evals, evecs, affine, mask, sphere,
+                                     scale, norm)
+    tensor_actor.GetProperty().SetOpacity(opacity)
+    return tensor_actor
+
+
+class OdfSlicerGPUActor(OdfSlicerActor):
+    """ ODF slicer with SH coefficients in device memory.
+
+    Same as ``fury.actors.odf_slicer.OdfSlicerActor`` with a B matrix, but
+    ``odfs`` is a cupy array and the SH to SF product of the voxels inside
+    the display extent runs on the GPU. Only these SF values are copied to
+    host memory.
+    """
+
+    def _get_sf(self, mask):
+        sf = sh_to_sf_gpu(self.odfs[cupy.asarray(mask[self.indices])], self.B)
+        if self.norm:
+            sf /= np.abs(sf).max(axis=-1, keepdims=True)
+        return sf * self.scale
+
+
+def odf_slicer_gpu(sh, indices, shape, sphere, B_matrix, affine=None,
+                   scale=0.5, norm=True, radial_scale=True, opacity=1.,
+                   colormap=None, global_cm=False):
+    """ Slice an SH field in device memory as ODF glyphs.
+
+    Counterpart of ``fury.actor.odf_slicer`` with ``B_matrix`` for SH given
+    as a cupy array of the non-zero voxels only, so several slicers can share
+    one device array.
+
+    Parameters
+    ----------
+    sh : cupy.ndarray (N, n_coef)
+        SH coefficients of the voxels at ``indices``.
+    indices : tuple of ndarray (N,)
+        Voxel indices of ``sh`` in the grid, as returned by ``np.nonzero``.
+    shape : tuple
+        Grid shape.
+    sphere : Sphere
+        Sphere the SF values are evaluated on.
+    B_matrix : ndarray (n_coef, n_vertices)
+        SH to SF matrix on ``sphere``.
+    affine : ndarray (4, 4), optional
+        Voxel to world affine of the glyph centers.
+    scale : float, optional
+        Glyph scale.
+    norm : bool, optional
+        Normalize SF values by their maximum in each voxel.
+    radial_scale : bool, optional
+        Scale the sphere vertices by SF values.
+    opacity : float, optional
+        Glyph opacity.
+    colormap : None or str, optional
+        Colormap name, None for colors by orientation.
+    global_cm : bool, optional
+        Apply the colormap over all glyphs instead of per voxel.
+
+    Returns
+    -------
+    odf_actor : OdfSlicerGPUActor
+    """
+    vertices = sphere.vertices
+    faces = fix_winding_order(vertices, sphere.faces, clockwise=True)
+    if len(vertices) != B_matrix.shape[1]:
+        raise ValueError('Invalid number of SH coefficients. Expected {0}, '
+                         'got {1}.'.format(len(vertices), B_matrix.shape[1]))
+
+    return OdfSlicerGPUActor(sh, vertices, faces, indices, scale, norm,
+                             radial_scale, shape, global_cm, colormap,
+                             opacity, affine, B_matrix)
+
+
+def streamlines_actor(streamlines, opacity=1., linewidth=1, lod=True,
+                      lod_points=10 ** 4, lod_points_size=3):
+    """ Lines actor of streamlines, colored by orientation.
+
+    Same default look as ``fury.actor.line(streamlines)``. The vtkPolyData is
+    built with numpy from the ``ArraySequence`` buffers: points from
+    ``_data``, and the vtkCellArray offsets and connectivity from
+    ``_offsets`` and ``_lengths``, without a loop over streamlines.
+
+    Parameters
+    ----------
+    streamlines : ArraySequence or list of ndarray (N, 3)
+        Streamlines.
+    opacity : float, optional
+        Line opacity.
+    linewidth : float, optional
+        Line width in pixels.
+    lod : bool, optional
+        Use a vtkLODActor, which renders a point cloud while interacting.
+    lod_points : int, optional
+        Number of points of the point cloud.
+    lod_points_size : int, optional
+        Point size of the point cloud.
+
+    Returns
+    -------
+    stream_actor : vtkLODActor or vtkActor
+    """
+    if not isinstance(streamlines, ArraySequence):
+        streamlines = ArraySequence(streamlines)
+
+    data = np.ascontiguousarray(streamlines._data).reshape(-1, 3)
+    # nibabel leaves float offsets and lengths when all streamlines are empty
+    starts = np.asarray(streamlines._offsets, dtype=np.intp)
+    lengths = np.asarray(streamlines._lengths, dtype=np.intp)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    # point ids of the cells. Sliced sequences may skip part of _data.
+    connectivity = (np.repeat(starts - offsets[:-1], lengths) +
+                    np.arange(offsets[-1])).astype(np.int64)
+
+    # one color per streamline, from its end to end direction. Empty
+    # streamlines have no end points, their offset may be len(data).
+    nonempty = lengths > 0
+    orient = np.zeros((len(lengths), 3), dtype=data.dtype)
+    orient[nonempty] = np.abs(data[(starts + lengths - 1)[nonempty]] -
+                              data[starts[nonempty]])
+    norm = np.linalg.norm(orient, axis=1, keepdims=True)
+    line_colors = np.divide(orient, norm, out=np.zeros_like(orient), where=norm > 0)
+    colors = np.zeros(data.shape, dtype=np.uint8)
+    colors[connectivity] = np.repeat((255 * line_colors).astype(np.uint8), lengths, axis=0)
+
+    points = vtk.vtkPoints()
+    points.SetData(numpy_support.numpy_to_vtk(data, deep=True))
+    lines = vtk.vtkCellArray()
+    lines.SetData(numpy_support.numpy_to_vtkIdTypeArray(offsets, deep=True),
+                  numpy_support.numpy_to_vtkIdTypeArray(connectivity, deep=True))
+    vtk_colors = numpy_support.numpy_to_vtk(colors, deep=True,
+                                            array_type=vtk.VTK_UNSIGNED_CHAR)
+    vtk_colors.SetName('colors')
+
+    polydata = vtk.vtkPolyData()
+    polydata.SetPoints(points)
+    polydata.SetLines(lines)
+    polydata.GetPointData().SetScalars(vtk_colors)
+
+    mapper = vtk.vtkPolyDataMapper()
+    mapper.SetInputData(polydata)
+    mapper.ScalarVisibilityOn()
+    mapper.SetScalarModeToUsePointFieldData()
+    mapper.SelectColorArray('colors')
+
+    if lod:
+        stream_actor = vtk.vtkLODActor()
+        stream_actor.SetNumberOfCloudPoints(lod_points)
+        stream_actor.GetProperty().SetPointSize(lod_points_size)
+    else:
+        stream_actor = vtk.vtkActor()
+    stream_actor.SetMapper(mapper)
+    stream_actor.GetProperty().SetLineWidth(linewidth)
+    stream_actor.GetProperty().SetOpacity(opacity)
+    return stream_actor
@@ -1,12 +1,15 @@
 #!/usr/bin/env python
 
+import os
 import logging
-import numpy as np
 
+from nibabel.streamlines import Field
+from dipy.io.stateful_tractogram import Space, StatefulTractogram
 from dipy.io.streamline import load_tractogram, save_tractogram
 from dipy.workflows.workflow import Workflow
 from dipy.io.image import load_nifti
-from dipy.tracking.streamline import transform_streamlines
+from dtdipy.io.streamline import read_trk_header, load_trk_streamlines
+from dtdipy.tracking.streamline import transform_streamlines
 
 
 class TrackConvertFlow(Workflow):
@@ -43,11 +46,22 @@ class TrackConvertFlow(Workflow):
 
             logging.info('Convert track of {0}'.format(input_path))
 
-            track = load_tractogram(input_path, reference, bbox_valid_check=False)
+            header = None
+            if reference == 'same' and os.path.splitext(input_path)[1] == '.trk':
+                header = read_trk_header(input_path)
+
+            if header is not None and not header[Field.NB_SCALARS_PER_POINT] \
+                    and not header[Field.NB_PROPERTIES_PER_STREAMLINE]:
+                # no scalars or properties to carry over, use the fast reader
+                track = StatefulTractogram(load_trk_streamlines(input_path),
+                                           input_path, Space.RASMM)
+            else:
+                track = load_tractogram(input_path, reference, bbox_valid_check=False)
 
             if reference!='same' and vox:
                 _, affine = load_nifti(reference)
-                track.streamlines = transform_streamlines(track.streamlines, np.linalg.inv(affine))
+                track.streamlines = transform_streamlines(track.streamlines, affine,
+                                                           inverse=True, in_place=True)
 
             save_tractogram(track, out_track, bbox_valid_check=False)
 
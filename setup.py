@@ -154,6 +154,10 @@ def main(**extra_args):
           requires=info.REQUIRES,
           provides=info.PROVIDES,
           packages=['dtdipy',
+                    'dtdipy.io',
+                    'dtdipy.reconst',
+                    'dtdipy.tracking',
+                    'dtdipy.viz',
                     'dtdipy.workflows'],
 
           ext_modules=EXTS,